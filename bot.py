@@ -1,17 +1,28 @@
 
 # Импорт необходимых библиотек
 import asyncio
+import atexit
+import concurrent.futures
+import functools
+import hashlib
+import html
+import importlib.util
 import logging
+import random
+import signal
+import sys
 import time
-from typing import Optional, Union, List, Dict, Any, Tuple
-from dataclasses import dataclass
+import warnings
+from typing import Optional, Union, List, Dict, Any, Tuple, Callable, Awaitable, TypeVar, FrozenSet
+from dataclasses import dataclass, field
 from enum import Enum
 import re
 
 import gspread
 import telegram
 from oauth2client.service_account import ServiceAccountCredentials
-from gspread import Client
+from gspread import Client, Worksheet
+from gspread.utils import absolute_range_name
 from telegram import (
     CallbackQuery,
     InlineKeyboardButton,
@@ -29,6 +40,14 @@ from telegram.ext import (
     MessageHandler,
     filters,
 )
+from telegram.request import HTTPXRequest
+
+# В Python 3.12 ускорен внутренний цикл asyncio и появился eager_task_factory
+if sys.version_info < (3, 12):
+    warnings.warn(
+        "Для лучшей производительности бота рекомендуется Python 3.12+",
+        RuntimeWarning
+    )
 
 # Перечисления для типов контента
 class ContentType(Enum):
@@ -48,7 +67,7 @@ class SheetColumns:
     TYPE = 4           # Тип контента (menu, submenu, text, link и т.д.)
     EXTRA = 5          # Дополнительная информация
 
-@dataclass
+@dataclass(slots=True)
 class MenuItem:
     """Класс для представления элемента меню"""
     callback_data: str
@@ -58,22 +77,32 @@ class MenuItem:
     content_type: ContentType = ContentType.TEXT
     extra: str = ""
     
+    # Текст, данные и доп. информация в нижнем регистре для поиска
+    # (вычисляется один раз при загрузке)
+    _haystack: str = field(init=False, repr=False, compare=False)
+    # Экранированное для HTML превью данных в результатах поиска
+    _preview: str = field(init=False, repr=False, compare=False)
+    
+    def __post_init__(self) -> None:
+        # Разделитель \0 не дает совпадениям склеиваться через границу полей
+        self._haystack = f"{self.text}\0{self.data}\0{self.extra}".casefold()
+        
+        preview = self.data[:100] + "..." if len(self.data) > 100 else self.data
+        self._preview = html.escape(preview)
+    
     @classmethod
     def from_row(cls, row: List[str]) -> Optional['MenuItem']:
         """Создает объект MenuItem из строки таблицы"""
         if len(row) < 3:
             return None
-            
-        callback_data = row[0].strip()
-        parent = row[1].strip()
-        text = row[2].strip()
+        
+        # Обрезаем пробелы один раз и дополняем строку до полного набора столбцов
+        cells = [cell.strip() for cell in row[:6]]
+        cells += [""] * (6 - len(cells))
+        callback_data, parent, text, data, content_type_str, extra = cells
         
         if not callback_data or not text:
             return None
-            
-        data = row[3].strip() if len(row) > 3 else ""
-        content_type_str = row[4].strip() if len(row) > 4 else "text"
-        extra = row[5].strip() if len(row) > 5 else ""
         
         try:
             content_type = ContentType(content_type_str)
@@ -95,9 +124,18 @@ class Config:
     CREDS_FILE = " "
     SHEET_ID = " "
     CACHE_DURATION = 3600  # 1 час
+    SHEETS_MAX_WORKERS = 4 # Потоков для одновременных запросов к Google Sheets
     MAX_SEARCH_RESULTS = 5
     MAX_MESSAGE_LENGTH = 4000
     
+    # Лимиты Telegram на исходящие сообщения
+    RATE_LIMIT_PER_SECOND = 30        # Для всего бота
+    GROUP_RATE_LIMIT_PER_MINUTE = 20  # Для одной группы
+    MAX_TRACKED_MESSAGES = 10000      # Сколько последних правок сообщений помнить
+    MAX_SEND_RETRIES = 5              # Попыток отправки при RetryAfter
+    MAX_RETRY_DELAY = 30              # Максимальная пауза между попытками, сек
+    HTTP_POOL_SIZE = 256              # Соединений с Bot API (как у ApplicationBuilder, не меньше RATE_LIMIT_PER_SECOND)
+    
     # Кнопки интерфейса
     CONTACTS_BUTTON = "📞 Важные контакты"
     MENU_BUTTON = "📋 Меню"
@@ -111,6 +149,11 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+# Готовое к отправке содержимое: текст, клавиатура и режим разметки
+RenderedContent = Tuple[str, InlineKeyboardMarkup, Optional[str]]
+
 class DataCache:
     """Кэш для данных Google Sheets"""
     
@@ -118,21 +161,97 @@ class DataCache:
         self.cache_duration = cache_duration
         self.last_update: Optional[float] = None
         self.data: List[MenuItem] = []
+        self.by_id: Dict[str, MenuItem] = {}
+        self.children_by_parent: Dict[str, List[MenuItem]] = {}
+        self.trigrams: Dict[str, List[int]] = {}
+        self.generation = 0  # Увеличивается при каждом изменении данных
         
-    def is_valid(self) -> bool:
-        """Проверяет, актуален ли кэш"""
-        return (self.last_update is not None and 
-                time.time() - self.last_update < self.cache_duration)
-    
     def update(self, data: List[MenuItem]) -> None:
         """Обновляет кэш"""
+        by_id: Dict[str, MenuItem] = {}
+        children_by_parent: Dict[str, List[MenuItem]] = {}
+        trigrams: Dict[str, List[int]] = {}
+        for idx, item in enumerate(data):
+            by_id.setdefault(item.callback_data, item)
+            children_by_parent.setdefault(item.parent, []).append(item)
+            
+            haystack = item._haystack
+            for trigram in {haystack[i:i + 3] for i in range(len(haystack) - 2)}:
+                trigrams.setdefault(trigram, []).append(idx)
+        
         self.data = data
+        self.by_id = by_id
+        self.children_by_parent = children_by_parent
+        self.trigrams = trigrams
         self.last_update = time.time()
+        self.generation += 1
         
     def clear(self) -> None:
         """Очищает кэш"""
         self.data = []
+        self.by_id = {}
+        self.children_by_parent = {}
+        self.trigrams = {}
         self.last_update = None
+        self.generation += 1
+    
+    def search(self, search_text: str) -> List[MenuItem]:
+        """Ищет элементы по подстроке с помощью триграммного индекса"""
+        needle = search_text.casefold()
+        if len(needle) < 3:
+            return [item for item in self.data if needle in item._haystack]
+        
+        postings = []
+        for trigram in {needle[i:i + 3] for i in range(len(needle) - 2)}:
+            posting = self.trigrams.get(trigram)
+            if not posting:
+                return []
+            postings.append(posting)
+        
+        # Пересекаем списки, начиная с самого короткого
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                return []
+        
+        # Проверяем кандидатов настоящим поиском подстроки
+        return [
+            self.data[idx] for idx in sorted(candidates)
+            if needle in self.data[idx]._haystack
+        ]
+
+class TokenBucket:
+    """Ограничитель частоты запросов (алгоритм token bucket)"""
+    
+    __slots__ = ("rate", "capacity", "tokens", "last", "_lock")
+    
+    def __init__(self, rate: float, capacity: float):
+        """
+        Args:
+            rate: Скорость пополнения, токенов в секунду
+            capacity: Максимальное количество накопленных токенов
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self) -> None:
+        """Ждет появления токена и забирает его"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                
+                await asyncio.sleep((1 - self.tokens) / self.rate)
 
 class GoogleSheetsManager:
     """Менеджер для работы с Google Sheets"""
@@ -153,6 +272,25 @@ class GoogleSheetsManager:
         self.creds_file = creds_file
         self.sheet_id = sheet_id
         self._client = None
+        self._worksheet: Optional[Worksheet] = None
+        self._pool: Optional[concurrent.futures.ThreadPoolExecutor] = None
+    
+    async def _run_blocking(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Выполняет блокирующий вызов gspread в отдельном пуле потоков"""
+        if self._pool is None:
+            # Ограничение числа потоков защищает от всплеска запросов к API
+            self._pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=Config.SHEETS_MAX_WORKERS,
+                thread_name_prefix="gspread"
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, functools.partial(func, *args, **kwargs))
+    
+    def close(self) -> None:
+        """Останавливает пул потоков (при следующем запросе он будет создан заново)"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
         
     async def _get_client(self) -> Client:
         """Получает клиент Google Sheets"""
@@ -162,63 +300,103 @@ class GoogleSheetsManager:
                     "https://www.googleapis.com/auth/spreadsheets",
                     "https://www.googleapis.com/auth/drive"
                 ]
-                creds = ServiceAccountCredentials.from_json_keyfile_name(
+                # Чтение ключа и авторизация блокируют, выполняем их в потоке
+                creds = await self._run_blocking(
+                    ServiceAccountCredentials.from_json_keyfile_name,
                     self.creds_file, scope
                 )
-                self._client = gspread.authorize(creds)
+                self._client = await self._run_blocking(gspread.authorize, creds)
             except Exception as e:
-                logger.error(f"Ошибка создания клиента Google Sheets: {e}")
+                logger.error("Ошибка создания клиента Google Sheets: %s", e)
                 raise
         return self._client
-        
+    
+    async def _get_worksheet(self) -> Worksheet:
+        """Получает рабочий лист (метаданные таблицы запрашиваются один раз)"""
+        if self._worksheet is None:
+            client = await self._get_client()
+            spreadsheet = await self._run_blocking(client.open_by_key, self.sheet_id)
+            self._worksheet = spreadsheet.sheet1
+        return self._worksheet
+    
     async def fetch_data(self) -> List[MenuItem]:
         """Получает данные из Google Sheets"""
         try:
-            client = await self._get_client()
-            sheet = client.open_by_key(self.sheet_id).sheet1
-            raw_data = sheet.get_all_values()
+            sheet = await self._get_worksheet()
+            # Запрашиваем только значения ячеек, без обертки gspread
+            response = await self._run_blocking(
+                sheet.spreadsheet.values_get,
+                absolute_range_name(sheet.title),
+                params={"fields": "values"}
+            )
+            raw_data = response.get("values", [])
+            
+            # Пропускаем заголовок; пустые строки from_row отбрасывает сам
+            menu_items = [
+                item for row in raw_data[1:]
+                if (item := MenuItem.from_row(row))
+            ]
             
-            menu_items = []
-            for row in raw_data[1:]:  # Пропускаем заголовок
-                if not row or not any(cell.strip() for cell in row):
-                    continue
-                    
-                item = MenuItem.from_row(row)
-                if item:
-                    menu_items.append(item)
-                    
-            logger.info(f"Успешно загружено {len(menu_items)} элементов меню")
+            logger.info("Успешно загружено %s элементов меню", len(menu_items))
             return menu_items
             
         except gspread.SpreadsheetNotFound:
-            logger.error(f"Таблица с ID {self.sheet_id} не найдена")
+            logger.error("Таблица с ID %s не найдена", self.sheet_id)
             raise
         except gspread.APIError as e:
-            logger.error(f"Ошибка Google API: {e}")
+            logger.error("Ошибка Google API: %s", e)
             raise
         except Exception as e:
-            logger.error(f"Неожиданная ошибка при получении данных: {e}")
+            logger.error("Неожиданная ошибка при получении данных: %s", e)
             raise
 
     async def update_data(self, data: List[List[str]]) -> None:
-        """Обновляет данные в таблице"""
+        """Обновляет данные в таблице одним запросом batchUpdate"""
         try:
-            client = await self._get_client()
-            sheet = client.open_by_key(self.sheet_id).sheet1
-            sheet.clear()
-            sheet.append_rows(data)
+            sheet = await self._get_worksheet()
+            
+            requests = []
+            # Расширяем лист, если новые данные в него не помещаются
+            extra_rows = len(data) - sheet.row_count
+            if extra_rows > 0:
+                requests.append({"appendDimension": {
+                    "sheetId": sheet.id, "dimension": "ROWS", "length": extra_rows
+                }})
+            extra_cols = max(map(len, data), default=0) - sheet.col_count
+            if extra_cols > 0:
+                requests.append({"appendDimension": {
+                    "sheetId": sheet.id, "dimension": "COLUMNS", "length": extra_cols
+                }})
+            
+            # updateCells на весь лист очищает ячейки, не попавшие в rows,
+            # поэтому отдельный запрос clear не нужен
+            requests.append({"updateCells": {
+                "range": {"sheetId": sheet.id},
+                "rows": [
+                    {"values": [{"userEnteredValue": {"stringValue": cell}} for cell in row]}
+                    for row in data
+                ],
+                "fields": "userEnteredValue",
+            }})
+            
+            await self._run_blocking(sheet.spreadsheet.batch_update, {"requests": requests})
+            if len(requests) > 1:
+                # Размеры листа изменились, метаданные нужно перечитать
+                self._worksheet = None
             logger.info("Данные успешно обновлены")
         except Exception as e:
-            logger.error(f"Ошибка при обновлении данных: {e}")
+            logger.error("Ошибка при обновлении данных: %s", e)
             raise
 
 class MessageFormatter:
     """Форматирование сообщений"""
     
+    _NON_DIGIT = re.compile(r'\D')
+    
     @staticmethod
     def format_phone(text: str, phone: str, extra: str = "") -> str:
         """Форматирует сообщение с телефоном"""
-        formatted_phone = re.sub(r'\D', '', phone)
+        formatted_phone = MessageFormatter._NON_DIGIT.sub('', phone)
         if formatted_phone.startswith('8'):
             formatted_phone = '7' + formatted_phone[1:]
         
@@ -285,16 +463,83 @@ class NavigationManager:
         """Очищает стек навигации"""
         context.user_data['nav_stack'] = []
 
+# Строки кнопок навигации под меню (не меняются, создаются один раз)
+_NAV_ROW_INNER = [
+    InlineKeyboardButton("⬅️ Назад", callback_data="back"),
+    InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu"),
+    InlineKeyboardButton("🔄 Обновить", callback_data="refresh"),
+]
+_NAV_ROW_ROOT = _NAV_ROW_INNER[1:]
+_MAIN_MENU_NAV_ROW = [InlineKeyboardButton("🔄 Обновить данные", callback_data="refresh")]
+
+# Клавиатура под текстом, телефоном или ссылкой
+_LEAF_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("⬅️ Назад", callback_data="back")],
+    [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")]
+])
+
+# Клавиатура под сообщением об ошибке
+_ERROR_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")],
+    [InlineKeyboardButton("🔄 Обновить", callback_data="refresh")]
+])
+
 class ClinicBot:
     """Основной класс бота клиники"""
     
+    # Цикл событий, общий для всех запусков бота в процессе; закрывается
+    # при завершении процесса (close) или явно через close_shared_loop
+    _shared_loop: Optional[asyncio.AbstractEventLoop] = None
+    
     def __init__(self, token: str, creds_file: str, sheet_id: str):
         self.token = token
-        self.application = Application.builder().token(token).build()
+        # HTTP/2 мультиплексирует запросы в одном соединении, но требует пакет h2
+        http_version = "2" if importlib.util.find_spec("h2") else "1.1"
+        self.application = (
+            Application.builder()
+            .token(token)
+            .request(HTTPXRequest(
+                connection_pool_size=Config.HTTP_POOL_SIZE,
+                http_version=http_version
+            ))
+            .build()
+        )
         self.cache = DataCache()
         self.sheets_manager = GoogleSheetsManager(creds_file, sheet_id)
         self.formatter = MessageFormatter()
         self.nav_manager = NavigationManager()
+        self._refresh_lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None  # Задается в run_async
+        self._close_at_exit = False  # Зарегистрирован ли close в atexit
+        self._chat_queues: Dict[int, asyncio.Queue] = {}
+        self._chat_workers: Dict[int, asyncio.Task] = {}
+        self._limiter = TokenBucket(Config.RATE_LIMIT_PER_SECOND, Config.RATE_LIMIT_PER_SECOND)
+        self._group_limiters: Dict[int, TokenBucket] = {}
+        
+        # Последние отправленные правки сообщений: (chat_id, message_id) -> подпись
+        self._edit_state: Dict[Tuple[int, int], bytes] = {}
+        self._edit_locks: Dict[Tuple[int, int], asyncio.Lock] = {}
+        self._edit_waiters: Dict[Tuple[int, int], int] = {}
+        
+        # Собранные меню для текущего поколения кэша: (parent_id, is_main) -> (текст, клавиатура)
+        self._keyboards: Dict[Tuple[str, bool], Tuple[str, InlineKeyboardMarkup]] = {}
+        self._keyboards_generation = self.cache.generation
+        
+        # Обработчики кнопок клавиатуры
+        self._button_dispatch: Dict[str, Callable[[Update, CallbackContext], Awaitable[None]]] = {
+            Config.MENU_BUTTON: self.menu_command,
+            Config.CONTACTS_BUTTON: self.contacts_button,
+            Config.HELP_BUTTON: self.help_command,
+        }
+        
+        # Отрисовка типов контента; остальные типы показываются как текст
+        self._content_dispatch: Dict[ContentType, Callable[[MenuItem], RenderedContent]] = {
+            ContentType.MENU: lambda item: self._render_menu(item, is_main=True),
+            ContentType.SUBMENU: lambda item: self._render_menu(item, is_main=False),
+            ContentType.PHONE: self._render_phone_content,
+            ContentType.LINK: self._render_link_content,
+        }
         
         # Регистрируем обработчики
         self._register_handlers()
@@ -308,15 +553,39 @@ class ClinicBot:
             MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_text_message)
         )
         self.application.add_handler(CallbackQueryHandler(self.handle_callback_query))
+        self.application.add_error_handler(self.error_handler)
         
     async def get_menu_data(self, force_refresh: bool = False) -> List[MenuItem]:
-        """Получает данные меню с кэшированием"""
-        if force_refresh or not self.cache.is_valid():
+        """Получает данные меню с кэшированием
+        
+        Загруженный кэш отдается сразу, даже если устарел: его обновляет
+        фоновая задача _periodic_refresh.
+        """
+        if force_refresh or self.cache.last_update is None:
+            await self._refresh_cache(force=force_refresh)
+        
+        return self.cache.data
+    
+    async def _refresh_cache(self, force: bool = False) -> None:
+        """Загружает данные из Google Sheets, объединяя одновременные запросы"""
+        async with self._refresh_lock:
+            # Пока ждали блокировку, данные мог загрузить другой обработчик
+            if not force and self.cache.last_update is not None:
+                return
+            
             logger.info("Обновляем данные из Google Sheets...")
             data = await self.sheets_manager.fetch_data()
             self.cache.update(data)
-        
-        return self.cache.data
+    
+    async def _periodic_refresh(self) -> None:
+        """Периодически обновляет кэш в фоне"""
+        interval = max(self.cache.cache_duration - 60, 60)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self._refresh_cache(force=True)
+            except Exception as e:
+                logger.error("Ошибка фонового обновления данных: %s", e, exc_info=True)
     
     async def start_command(self, update: Update, context: CallbackContext) -> None:
         """Обработчик команды /start"""
@@ -324,7 +593,7 @@ class ClinicBot:
             return
             
         user = update.effective_user
-        logger.info(f"Пользователь {user.id} (@{user.username}) запустил бота")
+        logger.info("Пользователь %s (@%s) запустил бота", user.id, user.username)
         
         welcome_text = (
             f"👋 Добро пожаловать, {user.first_name}!\n\n"
@@ -383,8 +652,19 @@ class ClinicBot:
             return
             
         self.nav_manager.clear_nav_stack(context)
-        sent_message = await update.message.reply_text("📋 Загружаем главное меню...")
-        await self._show_main_menu(sent_message)
+        await self.get_menu_data()
+        text, reply_markup, parse_mode = self._render_main_menu()
+        
+        await self._safe_send_message(
+            chat_id=update.message.chat_id,
+            text=text,
+            reply_markup=reply_markup,
+            parse_mode=parse_mode
+        )
+    
+    async def contacts_button(self, update: Update, context: CallbackContext) -> None:
+        """Обработчик кнопки контактов"""
+        await self._show_contacts(update)
     
     async def handle_text_message(self, update: Update, context: CallbackContext) -> None:
         """Обработчик текстовых сообщений"""
@@ -394,14 +674,9 @@ class ClinicBot:
         text = update.message.text.strip()
         
         # Обработка кнопок клавиатуры
-        if text == Config.MENU_BUTTON:
-            await self.menu_command(update, context)
-            return
-        elif text == Config.CONTACTS_BUTTON:
-            await self._show_contacts(update)
-            return
-        elif text == Config.HELP_BUTTON:
-            await self.help_command(update, context)
+        handler = self._button_dispatch.get(text)
+        if handler:
+            await handler(update, context)
             return
         
         # Поиск по содержимому
@@ -412,9 +687,42 @@ class ClinicBot:
         query = update.callback_query
         if not query:
             return
-            
+        
+        # Тяжелую работу выполняем вне цикла обработки обновлений: порядок
+        # нажатий внутри чата сохраняется, а разные чаты не ждут друг друга
+        chat_id = update.effective_chat.id if update.effective_chat else query.from_user.id
+        self._enqueue(chat_id, self._do_callback_work, query, context)
         await query.answer()
+    
+    def _enqueue(self, chat_id: int, func: Callable[..., Awaitable[None]], *args: Any) -> None:
+        """Ставит задачу в очередь чата, запуская обработчик очереди при необходимости"""
+        queue = self._chat_queues.get(chat_id)
+        if queue is not None:
+            queue.put_nowait((func, args))
+            return
         
+        queue = self._chat_queues[chat_id] = asyncio.Queue()
+        queue.put_nowait((func, args))
+        # С eager_task_factory обработчик может завершиться прямо внутри create_task
+        worker = asyncio.create_task(self._chat_worker(chat_id, queue))
+        if not worker.done():
+            self._chat_workers[chat_id] = worker
+    
+    async def _chat_worker(self, chat_id: int, queue: asyncio.Queue) -> None:
+        """Последовательно выполняет задачи чата и завершается, когда очередь пуста"""
+        try:
+            while not queue.empty():
+                func, args = queue.get_nowait()
+                try:
+                    await func(*args)
+                except Exception as e:
+                    logger.error("Ошибка в очереди чата %s: %s", chat_id, e, exc_info=True)
+        finally:
+            self._chat_queues.pop(chat_id, None)
+            self._chat_workers.pop(chat_id, None)
+    
+    async def _do_callback_work(self, query: CallbackQuery, context: CallbackContext) -> None:
+        """Обрабатывает нажатие inline-кнопки"""
         try:
             # Специальные команды
             if query.data == "back":
@@ -441,132 +749,110 @@ class ClinicBot:
             await self._show_item_content(query.message, item, menu_data)
             
         except Exception as e:
-            logger.error(f"Ошибка в callback handler: {e}", exc_info=True)
+            logger.error("Ошибка в callback handler: %s", e, exc_info=True)
             await self._show_error(query.message, "Произошла ошибка")
     
     async def _show_item_content(self, message: Message, item: MenuItem, menu_data: List[MenuItem]) -> None:
         """Показывает содержимое элемента меню"""
-        if item.content_type == ContentType.MENU:
-            await self._show_menu(message, item, menu_data, is_main=True)
-        elif item.content_type == ContentType.SUBMENU:
-            await self._show_menu(message, item, menu_data, is_main=False)
-        elif item.content_type == ContentType.PHONE:
-            await self._show_phone_content(message, item)
-        elif item.content_type == ContentType.LINK:
-            await self._show_link_content(message, item)
-        else:
-            await self._show_text_content(message, item)
+        text, reply_markup, parse_mode = self._render_item(item)
+        await self._safe_edit_message(
+            message=message,
+            text=text,
+            reply_markup=reply_markup,
+            parse_mode=parse_mode
+        )
+    
+    def _render_item(self, item: MenuItem) -> RenderedContent:
+        """Готовит текст, клавиатуру и режим разметки для элемента меню"""
+        renderer = self._content_dispatch.get(item.content_type, self._render_text_content)
+        return renderer(item)
     
-    async def _show_menu(self, message: Message, parent_item: MenuItem, menu_data: List[MenuItem], is_main: bool = False) -> None:
-        """Показывает меню или подменю"""
+    def _render_menu(self, parent_item: MenuItem, is_main: bool = False) -> RenderedContent:
+        """Готовит меню или подменю"""
         # Находим дочерние элементы
-        children = [
-            item for item in menu_data 
-            if item.parent == parent_item.callback_data
-        ]
+        children = self.cache.children_by_parent.get(parent_item.callback_data, [])
         
         if not children:
-            await self._show_text_content(message, parent_item)
-            return
+            return self._render_text_content(parent_item)
         
-        # Создаем клавиатуру
-        keyboard = []
-        for child in children:
-            keyboard.append([InlineKeyboardButton(
-                child.text,
-                callback_data=child.callback_data
-            )])
-        
-        # Добавляем кнопки навигации
-        nav_buttons = []
-        if not is_main:
-            nav_buttons.append(InlineKeyboardButton("⬅️ Назад", callback_data="back"))
-        nav_buttons.append(InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu"))
-        nav_buttons.append(InlineKeyboardButton("🔄 Обновить", callback_data="refresh"))
-        
-        if nav_buttons:
-            keyboard.append(nav_buttons)
+        def build() -> Tuple[str, InlineKeyboardMarkup]:
+            keyboard = [
+                [InlineKeyboardButton(child.text, callback_data=child.callback_data)]
+                for child in children
+            ]
+            # Добавляем кнопки навигации
+            keyboard.append(_NAV_ROW_ROOT if is_main else _NAV_ROW_INNER)
+            
+            text = parent_item.text
+            if parent_item.data:
+                text += f"\n\n{parent_item.data}"
+            return text, InlineKeyboardMarkup(keyboard)
         
-        text = parent_item.text
-        if parent_item.data:
-            text += f"\n\n{parent_item.data}"
+        text, reply_markup = self._get_cached_menu((parent_item.callback_data, is_main), build)
+        return text, reply_markup, None
+    
+    def _get_cached_menu(
+        self,
+        key: Tuple[str, bool],
+        build: Callable[[], Tuple[str, InlineKeyboardMarkup]]
+    ) -> Tuple[str, InlineKeyboardMarkup]:
+        """Возвращает собранное меню, пересобирая его только после обновления кэша"""
+        if self._keyboards_generation != self.cache.generation:
+            self._keyboards.clear()
+            self._keyboards_generation = self.cache.generation
         
-        await self._safe_edit_message(
-            message=message,
-            text=text,
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
+        cached = self._keyboards.get(key)
+        if cached is None:
+            cached = self._keyboards[key] = build()
+        return cached
     
-    async def _show_phone_content(self, message: Message, item: MenuItem) -> None:
-        """Показывает контент с телефоном"""
+    def _render_phone_content(self, item: MenuItem) -> RenderedContent:
+        """Готовит контент с телефоном"""
         formatted_text = self.formatter.format_phone(item.text, item.data, item.extra)
         
-        keyboard = InlineKeyboardMarkup([
-            [InlineKeyboardButton("⬅️ Назад", callback_data="back")],
-            [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")]
-        ])
-        
-        await self._safe_edit_message(
-            message=message,
-            text=formatted_text,
-            reply_markup=keyboard,
-            parse_mode="HTML"
-        )
+        return formatted_text, _LEAF_KEYBOARD, "HTML"
     
-    async def _show_link_content(self, message: Message, item: MenuItem) -> None:
-        """Показывает контент со ссылкой"""
+    def _render_link_content(self, item: MenuItem) -> RenderedContent:
+        """Готовит контент со ссылкой"""
         formatted_text = self.formatter.format_link(item.text, item.data, item.extra)
         
-        keyboard = InlineKeyboardMarkup([
-            [InlineKeyboardButton("⬅️ Назад", callback_data="back")],
-            [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")]
-        ])
-        
-        await self._safe_edit_message(
-            message=message,
-            text=formatted_text,
-            reply_markup=keyboard,
-            parse_mode="HTML"
-        )
+        return formatted_text, _LEAF_KEYBOARD, "HTML"
     
-    async def _show_text_content(self, message: Message, item: MenuItem) -> None:
-        """Показывает текстовый контент"""
+    def _render_text_content(self, item: MenuItem) -> RenderedContent:
+        """Готовит текстовый контент"""
         formatted_text = self.formatter.format_text(item.text, item.data, item.extra)
         
-        keyboard = InlineKeyboardMarkup([
-            [InlineKeyboardButton("⬅️ Назад", callback_data="back")],
-            [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")]
-        ])
-        
-        await self._safe_edit_message(
-            message=message,
-            text=formatted_text,
-            reply_markup=keyboard
-        )
+        return formatted_text, _LEAF_KEYBOARD, None
     
-    async def _show_main_menu(self, message: Message) -> None:
-        """Показывает главное меню"""
-        menu_data = await self.get_menu_data()
-        main_items = [item for item in menu_data if not item.parent]
+    def _render_main_menu(self) -> RenderedContent:
+        """Готовит главное меню"""
+        main_items = self.cache.children_by_parent.get("", [])
         
         if not main_items:
-            await self._show_error(message, "Главное меню не настроено")
-            return
+            return self._render_error("Главное меню не настроено")
         
-        keyboard = []
-        for item in main_items:
-            keyboard.append([InlineKeyboardButton(
-                item.text,
-                callback_data=item.callback_data
-            )])
+        def build() -> Tuple[str, InlineKeyboardMarkup]:
+            keyboard = [
+                [InlineKeyboardButton(item.text, callback_data=item.callback_data)]
+                for item in main_items
+            ]
+            keyboard.append(_MAIN_MENU_NAV_ROW)
+            return "📋 <b>Главное меню</b>\n\nВыберите нужный раздел:", InlineKeyboardMarkup(keyboard)
         
-        keyboard.append([InlineKeyboardButton("🔄 Обновить данные", callback_data="refresh")])
+        # Пустой parent_id не встречается у элементов таблицы, поэтому ключ свободен
+        text, reply_markup = self._get_cached_menu(("", True), build)
+        return text, reply_markup, "HTML"
+    
+    async def _show_main_menu(self, message: Message) -> None:
+        """Показывает главное меню"""
+        await self.get_menu_data()
+        text, reply_markup, parse_mode = self._render_main_menu()
         
         await self._safe_edit_message(
             message=message,
-            text="📋 <b>Главное меню</b>\n\nВыберите нужный раздел:",
-            reply_markup=InlineKeyboardMarkup(keyboard),
-            parse_mode="HTML"
+            text=text,
+            reply_markup=reply_markup,
+            parse_mode=parse_mode
         )
     
     async def _show_contacts(self, update: Update) -> None:
@@ -575,8 +861,14 @@ class ClinicBot:
         contacts_item = self._find_menu_item(menu_data, "main_contacts")
         
         if contacts_item:
-            sent_message = await update.message.reply_text("📞 Загружаем контакты...")
-            await self._show_item_content(sent_message, contacts_item, menu_data)
+            # Данные уже в памяти, поэтому отправляем готовый ответ без заглушки
+            text, reply_markup, parse_mode = self._render_item(contacts_item)
+            await self._safe_send_message(
+                chat_id=update.message.chat_id,
+                text=text,
+                reply_markup=reply_markup,
+                parse_mode=parse_mode
+            )
         else:
             await update.message.reply_text("⚠️ Контакты временно недоступны")
     
@@ -594,15 +886,12 @@ class ClinicBot:
             return
         
         # Формируем ответ
-        response_text = f"🔍 <b>Результаты поиска по запросу:</b> {search_text}\n\n"
+        response_text = f"🔍 <b>Результаты поиска по запросу:</b> {html.escape(search_text)}\n\n"
         
         for i, item in enumerate(results[:Config.MAX_SEARCH_RESULTS], 1):
-            response_text += f"{i}. <b>{item.text}</b>\n"
-            if item.data:
-                preview = item.data[:100]
-                if len(item.data) > 100:
-                    preview += "..."
-                response_text += f"   {preview}\n"
+            response_text += f"{i}. <b>{html.escape(item.text)}</b>\n"
+            if item._preview:
+                response_text += f"   {item._preview}\n"
             response_text += "\n"
         
         if len(results) > Config.MAX_SEARCH_RESULTS:
@@ -625,25 +914,11 @@ class ClinicBot:
     
     def _search_items(self, items: List[MenuItem], search_text: str) -> List[MenuItem]:
         """Ищет элементы по тексту"""
-        search_lower = search_text.lower()
-        results = []
-        
-        for item in items:
-            # Поиск в тексте
-            if search_lower in item.text.lower():
-                results.append(item)
-            # Поиск в данных
-            elif search_lower in item.data.lower():
-                results.append(item)
-            # Поиск в дополнительной информации
-            elif search_lower in item.extra.lower():
-                results.append(item)
-        
-        return results
+        return self.cache.search(search_text)
     
     def _find_menu_item(self, items: List[MenuItem], callback_data: str) -> Optional[MenuItem]:
         """Находит элемент меню по callback_data"""
-        return next((item for item in items if item.callback_data == callback_data), None)
+        return self.cache.by_id.get(callback_data)
     
     async def _handle_back_button(self, query: CallbackQuery, context: CallbackContext) -> None:
         """Обрабатывает кнопку 'Назад'"""
@@ -671,29 +946,62 @@ class ClinicBot:
     
     async def _handle_refresh(self, query: CallbackQuery, context: CallbackContext) -> None:
         """Обрабатывает обновление данных"""
-        await query.edit_message_text("🔄 Обновляем данные...")
+        await self._safe_edit_message(query.message, "🔄 Обновляем данные...")
         
-        # Очищаем кэш и загружаем свежие данные
-        self.cache.clear()
+        # Загружаем свежие данные; до их получения остальные чаты видят прежний кэш
         await self.get_menu_data(force_refresh=True)
         
         # Показываем главное меню
         self.nav_manager.clear_nav_stack(context)
         await self._show_main_menu(query.message)
     
+    def _render_error(self, error_text: str) -> RenderedContent:
+        """Готовит сообщение об ошибке"""
+        return f"⚠️ {error_text}", _ERROR_KEYBOARD, None
+    
     async def _show_error(self, message: Message, error_text: str) -> None:
         """Показывает сообщение об ошибке"""
-        keyboard = InlineKeyboardMarkup([
-            [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")],
-            [InlineKeyboardButton("🔄 Обновить", callback_data="refresh")]
-        ])
+        text, reply_markup, parse_mode = self._render_error(error_text)
         
         await self._safe_edit_message(
             message=message,
-            text=f"⚠️ {error_text}",
-            reply_markup=keyboard
+            text=text,
+            reply_markup=reply_markup,
+            parse_mode=parse_mode
         )
     
+    async def _throttle(self, chat_id: int) -> None:
+        """Ждет, пока отправка в чат уложится в лимиты Telegram"""
+        # У групп и каналов отрицательный chat_id
+        if chat_id < 0:
+            limiter = self._group_limiters.get(chat_id)
+            if limiter is None:
+                limiter = self._group_limiters[chat_id] = TokenBucket(
+                    Config.GROUP_RATE_LIMIT_PER_MINUTE / 60,
+                    Config.GROUP_RATE_LIMIT_PER_MINUTE
+                )
+            await limiter.acquire()
+        
+        await self._limiter.acquire()
+    
+    async def _call_with_retry(self, chat_id: int, call: Callable[[], Awaitable[T]]) -> T:
+        """
+        Выполняет запрос к Telegram, повторяя его при превышении лимита
+        
+        Raises:
+            telegram.error.RetryAfter: Если лимит не снят за Config.MAX_SEND_RETRIES попыток
+        """
+        for attempt in range(1, Config.MAX_SEND_RETRIES + 1):
+            await self._throttle(chat_id)
+            try:
+                return await call()
+            except telegram.error.RetryAfter as e:
+                if attempt == Config.MAX_SEND_RETRIES:
+                    raise
+                if attempt == 1:
+                    logger.warning("Rate limit. Retry after %s seconds", e.retry_after)
+                await asyncio.sleep(min(e.retry_after, Config.MAX_RETRY_DELAY) + random.uniform(0, 0.25))
+    
     async def _safe_send_message(
         self,
         chat_id: int,
@@ -704,22 +1012,21 @@ class ClinicBot:
     ) -> Optional[Message]:
         """Безопасная отправка сообщения"""
         try:
-            return await self.application.bot.send_message(
-                chat_id=chat_id,
-                text=text,
-                reply_markup=reply_markup,
-                parse_mode=parse_mode,
-                disable_web_page_preview=disable_web_page_preview
+            return await self._call_with_retry(
+                chat_id,
+                lambda: self.application.bot.send_message(
+                    chat_id=chat_id,
+                    text=text,
+                    reply_markup=reply_markup,
+                    parse_mode=parse_mode,
+                    disable_web_page_preview=disable_web_page_preview
+                )
             )
-        except telegram.error.RetryAfter as e:
-            logger.warning(f"Rate limit. Retry after {e.retry_after} seconds")
-            await asyncio.sleep(e.retry_after)
-            return await self._safe_send_message(chat_id, text, reply_markup, parse_mode, disable_web_page_preview)
         except telegram.error.TelegramError as e:
-            logger.error(f"Telegram API error: {e}")
+            logger.error("Telegram API error: %s", e)
             return None
         except Exception as e:
-            logger.error(f"Unexpected error: {e}")
+            logger.error("Unexpected error: %s", e)
             return None
     
     async def _safe_edit_message(
@@ -729,39 +1036,83 @@ class ClinicBot:
         reply_markup=None,
         parse_mode=None
     ) -> bool:
-        """Безопасное редактирование сообщения"""
+        """Безопасное редактирование сообщения
+        
+        Одновременные одинаковые правки одного сообщения объединяются:
+        в Telegram уходит только первая из них.
+        """
+        key = (message.chat_id, message.message_id)
+        markup_json = reply_markup.to_json() if reply_markup else ""
+        signature = hashlib.blake2b(
+            f"{text}\0{markup_json}\0{parse_mode}".encode(), digest_size=8
+        ).digest()
+        
+        lock = self._edit_locks.get(key)
+        if lock is None:
+            lock = self._edit_locks[key] = asyncio.Lock()
+        self._edit_waiters[key] = self._edit_waiters.get(key, 0) + 1
+        
+        try:
+            async with lock:
+                if self._edit_state.get(key) == signature:
+                    return True
+                
+                success = await self._edit_message(message, text, reply_markup, parse_mode)
+                if success:
+                    self._remember_edit(key, signature)
+                return success
+        finally:
+            self._edit_waiters[key] -= 1
+            if not self._edit_waiters[key]:
+                del self._edit_waiters[key]
+                del self._edit_locks[key]
+    
+    def _remember_edit(self, key: Tuple[int, int], signature: bytes) -> None:
+        """Запоминает подпись последней правки, вытесняя самые старые записи"""
+        self._edit_state.pop(key, None)
+        self._edit_state[key] = signature
+        if len(self._edit_state) > Config.MAX_TRACKED_MESSAGES:
+            del self._edit_state[next(iter(self._edit_state))]
+    
+    async def _edit_message(
+        self,
+        message: Message,
+        text: str,
+        reply_markup=None,
+        parse_mode=None
+    ) -> bool:
+        """Редактирует сообщение с обработкой ошибок Telegram"""
         try:
             # Проверяем, отличается ли новый текст от текущего
             if message.text == text and message.reply_markup == reply_markup:
                 return True
-                
-            await message.edit_text(
-                text=text,
-                reply_markup=reply_markup,
-                parse_mode=parse_mode,
-                disable_web_page_preview=True
+            
+            await self._call_with_retry(
+                message.chat_id,
+                lambda: message.edit_text(
+                    text=text,
+                    reply_markup=reply_markup,
+                    parse_mode=parse_mode,
+                    disable_web_page_preview=True
+                )
             )
             return True
         except telegram.error.BadRequest as e:
             if "message is not modified" in str(e).lower():
                 return True
-            logger.warning(f"Bad request error: {e}")
+            logger.warning("Bad request error: %s", e)
             return False
-        except telegram.error.RetryAfter as e:
-            logger.warning(f"Rate limit. Retry after {e.retry_after} seconds")
-            await asyncio.sleep(e.retry_after)
-            return await self._safe_edit_message(message, text, reply_markup, parse_mode)
         except telegram.error.TelegramError as e:
-            logger.error(f"Telegram API error: {e}")
+            logger.error("Telegram API error: %s", e)
             return False
         except Exception as e:
-            logger.error(f"Unexpected error: {e}")
+            logger.error("Unexpected error: %s", e)
             return False
     
 
     async def error_handler(self, update: Update, context: CallbackContext) -> None:
         """Обработчик ошибок"""
-        logger.error(f"Exception while handling an update: {context.error}", exc_info=True)
+        logger.error("Exception while handling an update: %s", context.error, exc_info=True)
         
         try:
             if update.effective_message:
@@ -770,90 +1121,303 @@ class ClinicBot:
                     text="⚠️ Произошла внутренняя ошибка. Попробуйте позже или обратитесь к администратору."
                 )
         except Exception as e:
-            logger.error(f"Error in error handler: {e}")
+            logger.error("Error in error handler: %s", e)
 
     async def initialize(self) -> None:
-        """Инициализация приложения бота"""
-        #if not self.token or self.token == "8111740535:AAEzEBWQI0rFAdR4gjIGS2SghOOe7oN4L1U":
-         #   raise ValueError("Неверный или стандартный токен бота. Пожалуйста, укажите действительный токен.")
-
-        self.application = Application.builder().token(self.token).build()
+        """Подготовка бота к запуску (приложение и обработчики создаются в __init__)"""
+        # Прогреваем кэш, чтобы первый пользователь не ждал Google Sheets
+        try:
+            await self.get_menu_data(force_refresh=True)
+        except Exception as e:
+            logger.error("Не удалось загрузить данные при запуске: %s", e)
         
-        # Добавляем обработчики
-        self.application.add_handler(CommandHandler("start", self.start_command))
-        self.application.add_handler(CommandHandler("help", self.help_command))
-        self.application.add_handler(CommandHandler("menu", self.menu_command))
-        self.application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_text_message))
-        self.application.add_handler(CallbackQueryHandler(self.handle_callback_query))
-        self.application.add_error_handler(self.error_handler)
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._periodic_refresh())
 
     async def run_async(self) -> None:
         """Асинхронный запуск бота"""
+        self._loop = asyncio.get_running_loop()
+        
+        # Задачи, которые завершаются без ожидания (например, ответы из кэша),
+        # выполняются сразу, минуя очередь цикла событий (Python 3.12+).
+        # Цикл может принадлежать вызывающему коду, поэтому после работы
+        # возвращаем его прежнюю фабрику задач
+        previous_factory = self._loop.get_task_factory()
+        if hasattr(asyncio, "eager_task_factory"):
+            self._loop.set_task_factory(asyncio.eager_task_factory)
+        
+        try:
+            await self._serve()
+        finally:
+            self._loop.set_task_factory(previous_factory)
+    
+    async def _serve(self) -> None:
+        """Запускает опрос Telegram и работает до сигнала остановки"""
         try:
             await self.initialize()
             logger.info("🚀 Запускаем бота...")
-            await self.application.run_polling(drop_pending_updates=True)
+            
+            # run_polling создает собственный цикл событий и не работает внутри
+            # уже запущенного, поэтому запускаем приложение вручную.
+            # initialize повторно ничего не делает, а shutdown вызывается только
+            # в aclose, так что HTTP-соединения переживают перезапуски run в
+            # общем цикле событий (main_async закрывает их после каждого запуска)
+            await self.application.initialize()
+            
+            # Работаем до SIGINT/SIGTERM (или до отмены задачи, если
+            # обработчики сигналов установить нельзя)
+            stop = self._loop.create_future()
+            installed_signals = self._install_signal_handlers(stop)
+            try:
+                await self.application.start()
+                await self.application.updater.start_polling(drop_pending_updates=True)
+                await stop
+                logger.info("🛑 Получен сигнал остановки, завершаем работу...")
+            finally:
+                for sig in installed_signals:
+                    self._loop.remove_signal_handler(sig)
+                if self.application.updater.running:
+                    await self.application.updater.stop()
+                if self.application.running:
+                    await self.application.stop()
         except Exception as e:
-            logger.error(f"❌ Критическая ошибка: {e}", exc_info=True)
+            logger.error("❌ Критическая ошибка: %s", e, exc_info=True)
             raise
+        finally:
+            await self.shutdown()
+    
+    def _install_signal_handlers(self, stop: asyncio.Future) -> List[signal.Signals]:
+        """Устанавливает обработчики SIGINT и SIGTERM, завершающие future stop"""
+        def request_stop() -> None:
+            if not stop.done():
+                stop.set_result(None)
+        
+        installed = []
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                self._loop.add_signal_handler(sig, request_stop)
+            except (NotImplementedError, RuntimeError, ValueError):
+                # Windows или не главный поток: остается обработка KeyboardInterrupt
+                continue
+            installed.append(sig)
+        return installed
+    
+    async def shutdown(self) -> None:
+        """Останавливает фоновые задачи бота и дожидается их завершения"""
+        tasks = list(self._chat_workers.values())
+        if self._refresh_task is not None:
+            tasks.append(self._refresh_task)
+            self._refresh_task = None
+        
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        
+        self.sheets_manager.close()
+
+    async def aclose(self) -> None:
+        """Закрывает приложение Telegram и его HTTP-соединения"""
+        await self.application.shutdown()
+    
+    def close(self) -> None:
+        """Окончательно освобождает ресурсы после run: приложение и общий цикл событий
+        
+        Вызывается автоматически при завершении процесса.
+        """
+        loop = self._shared_loop
+        if loop is not None and not loop.is_closed():
+            try:
+                loop.run_until_complete(self.aclose())
+            finally:
+                self.close_shared_loop()
 
     def run(self) -> None:
         """Синхронный запуск бота"""
         try:
-            # Проверка токена перед запуском
-            #if not self.token or self.token == "8111740535:AAEzEBWQI0rFAdR4gjIGS2SghOOe7oN4L1U":
-             #   logger.error("❌ Неверный или стандартный токен бота. Пожалуйста, укажите действительный токен.")
-              #  return
-
-            # Применяем nest_asyncio для Jupyter/Colab
             try:
-                import nest_asyncio
-                nest_asyncio.apply()
-                logger.info("✅ nest_asyncio применен")
-            except ImportError:
-                logger.warning("⚠️ nest_asyncio не найден, может не работать в некоторых средах")
-
-            asyncio.run(self.run_async())
+                asyncio.get_running_loop()
+                loop_running = True
+            except RuntimeError:
+                loop_running = False
+            
+            if loop_running:
+                # Цикл событий уже запущен (Jupyter/Colab): без nest_asyncio
+                # asyncio.run в нем не работает
+                if not hasattr(asyncio, "_nest_patched"):
+                    try:
+                        import nest_asyncio
+                        nest_asyncio.apply()
+                        logger.info("✅ nest_asyncio применен")
+                    except ImportError:
+                        logger.warning("⚠️ nest_asyncio не найден, может не работать в некоторых средах")
+                
+                asyncio.run(self.run_async())
+            else:
+                self._run_in_shared_loop()
         except KeyboardInterrupt:
             logger.info("🛑 Бот остановлен пользователем")
         except Exception as e:
-            logger.error(f"❌ Ошибка при запуске бота: {e}", exc_info=True)
+            logger.error("❌ Ошибка при запуске бота: %s", e, exc_info=True)
 
-async def main_async():
-    """Асинхронная главная функция запуска бота"""
-    # Проверяем конфигурацию
-    if Config.TOKEN == "8111740535:AAEzEBWQI0rFAdR4gjIGS2SghOOe7oN4L1U":
-        logger.error("⚠️ Необходимо указать токен бота в Config.TOKEN")
-        return
+    def _run_in_shared_loop(self) -> None:
+        """Запускает бота в общем цикле событий процесса"""
+        loop = self._get_shared_loop()
+        asyncio.set_event_loop(loop)
+        if not self._close_at_exit:
+            # Цикл и приложение переживают перезапуски run, поэтому
+            # освобождаем их только при выходе из процесса
+            atexit.register(self.close)
+            self._close_at_exit = True
+        try:
+            loop.run_until_complete(self.run_async())
+        except KeyboardInterrupt:
+            # Обработчики сигналов не установлены: отменяем и дожидаемся
+            # оставшихся задач, чтобы они корректно закрыли соединения
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            raise
     
-    if not Config.CREDS_FILE:
-        logger.error("⚠️ Необходимо указать файл с учетными данными в Config.CREDS_FILE")
-        return
+    @classmethod
+    def _get_shared_loop(cls) -> asyncio.AbstractEventLoop:
+        """Возвращает общий цикл событий, создавая его при первом запуске"""
+        if cls._shared_loop is None or cls._shared_loop.is_closed():
+            loop_factory = _uvloop_factory() or asyncio.new_event_loop
+            cls._shared_loop = loop_factory()
+        return cls._shared_loop
     
-    if not Config.SHEET_ID:
-        logger.error("⚠️ Необходимо указать ID Google Sheets в Config.SHEET_ID")
-        return
+    @classmethod
+    def close_shared_loop(cls) -> None:
+        """Закрывает общий цикл событий (при завершении процесса)"""
+        loop = cls._shared_loop
+        if loop is None or loop.is_closed():
+            return
+        
+        try:
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.run_until_complete(loop.shutdown_default_executor())
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+            cls._shared_loop = None
+
+def _uvloop_factory() -> Optional[Callable[[], asyncio.AbstractEventLoop]]:
+    """Возвращает фабрику циклов событий uvloop, если он установлен"""
+    # uvloop заметно быстрее стандартного цикла событий, но не обязателен;
+    # импортируем его только при запуске, а не при импорте модуля
+    try:
+        import uvloop
+    except ImportError:
+        return None
+    return uvloop.new_event_loop
+
+# Значения параметров Config, которые считаются незаполненными
+_DEFAULT_PLACEHOLDERS: FrozenSet[str] = frozenset({"", "CHANGE_ME", "YOUR_TOKEN_HERE"})
+
+# Последняя записанная в лог ошибка конфигурации
+_config_error: Optional[ValueError] = None
+
+def _check_config() -> Tuple[str, str, str]:
+    """
+    Проверяет параметры Config
+    
+    Returns:
+        Кортеж (TOKEN, CREDS_FILE, SHEET_ID)
+    
+    Raises:
+        ValueError: Если параметр не задан или оставлен стандартным
+    """
+    if Config.TOKEN.strip() in _DEFAULT_PLACEHOLDERS:
+        raise ValueError("⚠️ Необходимо указать токен бота в Config.TOKEN")
+    
+    if Config.CREDS_FILE.strip() in _DEFAULT_PLACEHOLDERS:
+        raise ValueError("⚠️ Необходимо указать файл с учетными данными в Config.CREDS_FILE")
+    
+    if Config.SHEET_ID.strip() in _DEFAULT_PLACEHOLDERS:
+        raise ValueError("⚠️ Необходимо указать ID Google Sheets в Config.SHEET_ID")
+    
+    return Config.TOKEN, Config.CREDS_FILE, Config.SHEET_ID
+
+def _validate_config() -> Tuple[str, str, str]:
+    """
+    Проверяет конфигурацию
+    
+    Config проверяется при каждом вызове, чтобы исправленные значения
+    подхватывались без перезапуска процесса. Повторяющаяся ошибка
+    в лог не пишется: поднимается уже созданный экземпляр исключения.
+    
+    Returns:
+        Кортеж (TOKEN, CREDS_FILE, SHEET_ID)
     
-    # Создаем и запускаем бота
-    bot = ClinicBot(
-        token=Config.TOKEN,
-        creds_file=Config.CREDS_FILE,
-        sheet_id=Config.SHEET_ID
+    Raises:
+        ValueError: Если параметр не задан или оставлен стандартным
+    """
+    global _config_error
+    
+    try:
+        config = _check_config()
+    except ValueError as e:
+        if _config_error is not None and _config_error.args == e.args:
+            raise _config_error.with_traceback(None) from None
+        _config_error = e
+        logger.error("%s", e)
+        raise
+    
+    _config_error = None
+    return config
+
+@functools.lru_cache(maxsize=1)
+def _build_bot(loop: asyncio.AbstractEventLoop) -> ClinicBot:
+    """
+    Создает бота по конфигурации для цикла событий loop
+    
+    Приложение и блокировки бота привязаны к циклу, в котором он работает,
+    поэтому экземпляр переиспользуется только в том же цикле.
+    
+    Raises:
+        ValueError: Если конфигурация некорректна
+    """
+    token, creds_file, sheet_id = _validate_config()
+    return ClinicBot(
+        token=token,
+        creds_file=creds_file,
+        sheet_id=sheet_id
     )
+
+async def main_async():
+    """Асинхронная главная функция запуска бота"""
+    try:
+        bot = _build_bot(asyncio.get_running_loop())
+    except ValueError:
+        # Ошибка уже записана в лог в _validate_config
+        return
     
-    await bot.run_async()
+    try:
+        await bot.run_async()
+    finally:
+        # asyncio.run при следующем вызове создаст новый цикл событий,
+        # поэтому бот, привязанный к текущему, больше не пригоден
+        await bot.aclose()
+        _build_bot.cache_clear()
 
 def main():
     """Главная функция запуска бота"""
-    bot = ClinicBot(
-        token=Config.TOKEN,
-        creds_file=Config.CREDS_FILE,
-        sheet_id=Config.SHEET_ID
-    )
+    # run работает в уже запущенном цикле (через nest_asyncio) или в общем
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = ClinicBot._get_shared_loop()
+    
+    try:
+        bot = _build_bot(loop)
+    except ValueError:
+        # Ошибка уже записана в лог в _validate_config
+        return
+    
+    # Общий цикл событий не закрываем: повторный вызов main (например, при
+    # перезапуске под супервизором) продолжит работу в нем же
     bot.run()
 
-import nest_asyncio
-nest_asyncio.apply()
-
 if __name__ == "__main__":
     main()